@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+import os
+
+# Size of the master icon that ships with the app, and the iOS sizes
+# scaled down from it
+MASTER_SIZE = 1024
+SCALED_SIZES = [180, 167, 152, 120, 87, 80, 76, 60, 58, 40, 29, 20]
+
+# Scaled sizes are build artifacts the App Store repacks, so favour fast
+# encoding; the shipped master keeps zlib's default level 6. optimize is
+# left off for both, since Pillow would then ignore compress_level and
+# encode at level 9
+def save_png(image, path, master=False):
+    image.save(path, 'PNG', compress_level=6 if master else 1)
+
+# Halve the image repeatedly down to min_size, largest level first
+def build_pyramid(image, min_size=32):
+    pyramid = [image]
+    while pyramid[-1].width // 2 >= min_size:
+        width, height = pyramid[-1].size
+        pyramid.append(pyramid[-1].resize((width // 2, height // 2),
+                                          Image.LANCZOS))
+    return pyramid
+
+# Pick the smallest pyramid level that is still at least twice the target
+def pyramid_level(pyramid, size):
+    for level in reversed(pyramid):
+        if level.width >= size * 2:
+            return level
+    return pyramid[0]
+
+# Save img as icon_<size>.png in out_dir for every size, returning the paths
+def batch_resize(img, sizes, out_dir):
+    # Decode once up front; a loaded image is safe to resize from several
+    # threads at the same time. Only modes that cannot be resampled
+    # directly, such as palette images, are converted; RGB stays RGB
+    # because the App Store rejects a master icon with an alpha channel
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA')
+    img.load()
+    
+    # Scale each size down from the nearest larger pyramid level
+    pyramid = build_pyramid(img)
+    icon_paths = {size: os.path.join(out_dir, f"icon_{size}.png")
+                  for size in sizes}
+    
+    def save_scaled(size):
+        source = pyramid_level(pyramid, size)
+        scaled_icon = source.resize((size, size), Image.LANCZOS)
+        save_png(scaled_icon, icon_paths[size])
+    
+    # Pillow releases the GIL while resizing and encoding, so the
+    # sizes can be produced in parallel threads
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(save_scaled, sizes))
+    
+    return icon_paths
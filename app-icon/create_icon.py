@@ -1,77 +1,204 @@
 #!/usr/bin/env python3
+# Resizing and blurring run through Pillow's C code. Pillow-SIMD is a
+# drop-in replacement with SSE4/AVX2 kernels for exactly those paths:
+#   pip uninstall pillow && CC="cc -mavx2" pip install pillow-simd
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
+import filecmp
+import functools
+import glob
+import hashlib
+import json
 import math
+import numpy as np
 import os
+import PIL
+import shutil
 
-# Create the base icon
-def create_voicejournal_icon(save_path, size=1024):
-    # Create a new image with a white background
-    icon = Image.new('RGBA', (size, size), (255, 255, 255, 0))
-    draw = ImageDraw.Draw(icon)
+import _resize_common
+from _resize_common import MASTER_SIZE, SCALED_SIZES, batch_resize, save_png
+
+# Build a vertical RGBA gradient array in one vectorized pass
+def vertical_gradient(width, progress, top, bottom):
+    # progress holds one value in [0, 1] per row, top to bottom
+    progress = np.asarray(progress, dtype=np.float32)[:, None]
+    top = np.array(top, dtype=np.float32)
+    bottom = np.array(bottom, dtype=np.float32)
+    rows = (top + (bottom - top) * progress).astype(np.uint8)
+    return np.broadcast_to(rows[:, None, :], (len(rows), width, 4))
+
+# How far each corner row of an ImageDraw rounded rectangle of this width
+# is inset from the left and right edges, for the top and bottom corners
+@functools.lru_cache(maxsize=None)
+def corner_insets(width, radius):
+    # Only the corner rows depend on ImageDraw's arc rasterizer, so draw one
+    # small rectangle tall enough to keep its corners apart and read them off
+    band = int(min(width, radius * 2) // 2) + 1
+    height = int(radius * 2) + 2 * band + 4
+    template = Image.new('L', (width + 1, height + 1), 0)
+    ImageDraw.Draw(template).rounded_rectangle(
+        [(0, 0), (width, height)], radius, fill=255)
+    filled = np.asarray(template) > 0
+    
+    def insets(rows):
+        empty = ~rows.any(axis=1)
+        left = np.where(empty, np.inf, rows.argmax(axis=1))
+        right = np.where(empty, np.inf, rows[:, ::-1].argmax(axis=1))
+        return left, right
+    
+    return insets(filled[:band]) + insets(filled[::-1][:band])
+
+# Draw a rounded rectangle with ImageDraw on a small image just around it
+# and read it back over an np.ogrid pixel grid
+def drawn_rect_mask(ys, xs, box, radius):
+    # Shift by even whole pixels so ImageDraw rounds the box the same way
+    left, top = 2 * (box[0] // 2), 2 * (box[1] // 2)
+    width, height = math.ceil(box[2] - left) + 2, math.ceil(box[3] - top) + 2
+    shape = Image.new('L', (width, height), 0)
+    ImageDraw.Draw(shape).rounded_rectangle(
+        [box[0] - left, box[1] - top, box[2] - left, box[3] - top], radius,
+        fill=255)
+    
+    rows, cols = ys.ravel() - int(top), xs.ravel() - int(left)
+    inside = (((rows >= 0) & (rows < height))[:, None] &
+              ((cols >= 0) & (cols < width))[None, :])
+    filled = np.asarray(shape)[np.ix_(rows.clip(0, height - 1),
+                                      cols.clip(0, width - 1))] > 0
+    return inside & filled
+
+# Rasterize a filled rounded rectangle over an np.ogrid pixel grid, pixel
+# for pixel the same as ImageDraw.rounded_rectangle
+def rounded_rect_mask(ys, xs, box, radius):
+    # Snap the box to whole pixels the same way ImageDraw does
+    x0, y0, x1, y1 = (round(edge) for edge in box)
+    band = int(min(x1 - x0, radius * 2) // 2) + 1
+    
+    # ImageDraw sizes the corners from the unrounded box, joins them into
+    # half circles or an ellipse once they meet and falls back to a plain
+    # rectangle without a radius, none of which the template rows can
+    # reproduce, so those shapes are drawn directly
+    if (radius <= 0 or y1 - y0 < 2 * band + 2 or
+            min(box[2] - box[0], box[3] - box[1], x1 - x0) < radius * 2):
+        return drawn_rect_mask(ys, xs, box, radius)
+    top_left, top_right, bottom_left, bottom_right = corner_insets(
+        x1 - x0, radius)
+    
+    # Each row of a rounded rectangle is a single span, so work out the
+    # span ends per row and leave one comparison per pixel
+    rows = ys.ravel()
+    inside = (rows >= y0) & (rows <= y1)
+    left = np.where(inside, x0, np.inf)
+    right = np.where(inside, x1, -np.inf)
+    for offset, left_inset, right_inset in ((rows - y0, top_left, top_right),
+                                            (y1 - rows, bottom_left,
+                                             bottom_right)):
+        corner = inside & (offset < len(left_inset))
+        left[corner] = x0 + left_inset[offset[corner]]
+        right[corner] = x1 - right_inset[offset[corner]]
+    return (xs >= left[:, None]) & (xs <= right[:, None])
+
+# Slice a window grown by pad pixels on every side, clipped to the canvas
+def padded_window(top, bottom, left, right, pad, size):
+    return np.s_[max(0, top - pad):min(size, bottom + pad),
+                 max(0, left - pad):min(size, right + pad)]
+
+# Gaussian-blur an 'L' or 'RGBA' array through PIL
+def gaussian_blur(array, radius):
+    mode = 'L' if array.ndim == 2 else 'RGBA'
+    image = Image.fromarray(array, mode)
+    return np.asarray(image.filter(ImageFilter.GaussianBlur(radius)))
+
+# Divide uint16 products by 255 in place with rounding, using shifts
+# (Jim Blinn)
+def div255(x):
+    x += 128
+    x += x >> 8
+    x >>= 8
+    return x
+
+# Premultiply straight-alpha RGBA pixels by their alpha in place
+def premultiply(layer):
+    alpha = layer[..., 3:4].astype(np.uint16)
+    layer[..., :3] = div255(layer[..., :3] * alpha)
+    return layer
+
+# Turn premultiplied RGBA pixels back into straight alpha in place
+def unpremultiply(canvas):
+    # Only partially transparent pixels change
+    partial = (canvas[..., 3] > 0) & (canvas[..., 3] < 255)
+    pixels = canvas[partial].astype(np.uint16)
+    alpha = pixels[:, 3:4]
+    pixels[:, :3] = (pixels[:, :3] * 255 + alpha // 2) // alpha
+    canvas[partial] = np.minimum(pixels, 255)
+
+# Blend a premultiplied RGBA layer over the canvas in place using 8-bit
+# integer math
+def alpha_composite_u8(dst, src):
+    # The canvas is kept premultiplied, so every channel, alpha included,
+    # is src + dst * (255 - src_alpha) / 255; products stay within uint16
+    inverse = 255 - src[..., 3:4].astype(np.uint16)
+    blended = div255(np.multiply(dst, inverse))
+    dst[...] = np.add(blended, src, out=blended)
+
+# Render the icon into a preallocated (size, size, 4) uint8 buffer
+def render_icon(canvas, size):
+    # Compose everything into the single buffer, starting fully transparent;
+    # colors stay premultiplied by alpha until the end
+    canvas[...] = 0
+    ys, xs = np.ogrid[:size, :size]
     
     # Rounded square background with gradient
     # Create a mask for the rounded corners
-    mask = Image.new('L', (size, size), 0)
-    mask_draw = ImageDraw.Draw(mask)
     corner_radius = size // 5  # Adjust for desired roundness
-    mask_draw.rounded_rectangle([(0, 0), (size, size)], corner_radius, fill=255)
+    mask = rounded_rect_mask(ys, xs, (0, 0, size, size), corner_radius)
     
     # Create gradient background
-    gradient = Image.new('RGBA', (size, size), (0, 0, 0, 0))
-    gradient_draw = ImageDraw.Draw(gradient)
-    
-    # Blue gradient (from lighter to darker)
-    for y in range(size):
-        # Calculate color based on position
-        r = int(41 + (33 - 41) * y / size)  # Darker blue at bottom
-        g = int(128 + (76 - 128) * y / size)
-        b = int(185 + (156 - 185) * y / size)
-        gradient_draw.line([(0, y), (size, y)], fill=(r, g, b, 255))
+    # Blue gradient (from lighter to darker blue at bottom)
+    gradient = vertical_gradient(size, np.arange(size) / size,
+                                 (41, 128, 185, 255), (33, 76, 156, 255))
     
     # Apply the mask to the gradient
-    icon.paste(gradient, (0, 0), mask)
+    np.copyto(canvas, gradient, where=mask[..., None])
     
     # Draw a stylized journal/notebook page
     page_width = size * 0.7
     page_height = size * 0.8
     page_x = (size - page_width) / 2
     page_y = (size - page_height) / 2
+    page_box = (page_x, page_y, page_x + page_width, page_y + page_height)
     
     # Create another mask for the page with slightly rounded corners
-    page_mask = Image.new('L', (size, size), 0)
-    page_mask_draw = ImageDraw.Draw(page_mask)
     page_corner_radius = size // 20
-    page_mask_draw.rounded_rectangle([(page_x, page_y), (page_x + page_width, page_y + page_height)], 
-                                   page_corner_radius, fill=255)
-    
-    # Create the page with a subtle gradient
-    page = Image.new('RGBA', (size, size), (0, 0, 0, 0))
-    page_draw = ImageDraw.Draw(page)
-    
-    # White to very light blue gradient for the page
-    for y in range(int(page_y), int(page_y + page_height)):
-        progress = (y - page_y) / page_height
-        # Very subtle gradient from white to light blue-gray
-        r = int(255 - 10 * progress)
-        g = int(255 - 5 * progress)
-        b = int(255)
-        page_draw.line([(page_x, y), (page_x + page_width, y)], fill=(r, g, b, 255))
-    
-    # Add a subtle shadow to the page
-    shadow = Image.new('RGBA', (size, size), (0, 0, 0, 0))
-    shadow_draw = ImageDraw.Draw(shadow)
+    page_mask = rounded_rect_mask(ys, xs, page_box, page_corner_radius)
+    
+    # Very subtle gradient from white to light blue-gray for the page
+    # Clamp the progress so the gradient reaches every row the page mask
+    # covers, including the last partial row, and span every column, where
+    # per-row lines would stop short of the mask's rounded right edge
+    page_progress = np.clip((np.arange(size) - page_y) / page_height, 0, 1)
+    page = vertical_gradient(size, page_progress,
+                             (255, 255, 255, 255), (245, 250, 255, 255))
+    
+    # Add a subtle shadow to the page, blurring only the area around it
     shadow_offset = size // 50
-    shadow_draw.rounded_rectangle(
-        [(page_x + shadow_offset, page_y + shadow_offset), 
-         (page_x + page_width + shadow_offset, page_y + page_height + shadow_offset)], 
-        page_corner_radius, fill=(0, 0, 0, 50))
-    shadow = shadow.filter(ImageFilter.GaussianBlur(size // 100))
+    shadow_blur = size // 100
+    shadow_box = tuple(edge + shadow_offset for edge in page_box)
+    shadow_window = padded_window(
+        round(shadow_box[1]), round(shadow_box[3]) + 1,
+        round(shadow_box[0]), round(shadow_box[2]) + 1,
+        shadow_blur * 3, size)
+    shadow_alpha = rounded_rect_mask(ys[shadow_window[0]],
+                                     xs[:, shadow_window[1]],
+                                     shadow_box, page_corner_radius)
+    shadow = np.zeros(shadow_alpha.shape + (4,), np.uint8)
+    shadow[..., 3] = gaussian_blur(shadow_alpha.astype(np.uint8) * 50,
+                                   shadow_blur)
     
+    # The shadow is black, so it is already premultiplied
     # Composite the shadow onto the icon first (so it's behind the page)
-    icon = Image.alpha_composite(icon, shadow)
+    alpha_composite_u8(canvas[shadow_window], shadow)
     
     # Then apply the page mask to the page and paste it onto the icon
-    icon.paste(page, (0, 0), page_mask)
+    np.copyto(canvas, page, where=page_mask[..., None])
     
     # Draw sound wave lines in the middle of the page
     wave_height = page_height * 0.5
@@ -85,91 +212,172 @@ def create_voicejournal_icon(save_path, size=1024):
     max_amplitude = wave_height * 0.25
     
     # The central line should be tallest, with lines tapering off to sides
-    amplitudes = []
-    for i in range(num_lines):
-        # Position from center (0 = center, 1 = edge)
-        distance_from_center = abs(i - (num_lines - 1) / 2) / ((num_lines - 1) / 2)
-        # Smaller amplitude as we move away from center
-        amplitude = max_amplitude * (1 - 0.8 * distance_from_center**2)
-        amplitudes.append(amplitude)
-    
-    # Draw the sound wave lines with gradient color
-    wave_overlay = Image.new('RGBA', (size, size), (0, 0, 0, 0))
-    wave_draw = ImageDraw.Draw(wave_overlay)
-    
-    for i in range(num_lines):
-        x = wave_x + i * line_spacing
-        amplitude = amplitudes[i]
-        
-        # Central position determines color intensity
-        center_factor = 1 - abs(i - (num_lines - 1) / 2) / ((num_lines - 1) / 2)
-        
-        # Gradient from purple to blue
-        r = int(89 + (41 - 89) * center_factor)
-        g = int(65 + (128 - 65) * center_factor)
-        b = int(169 + (185 - 169) * center_factor)
-        
-        line_width = max(2, int(size * 0.015 * (0.5 + 0.5 * center_factor)))  # Thicker in center
-        
-        # Draw rounded line segments
-        wave_draw.rounded_rectangle(
-            [(x - line_width/2, wave_y + wave_height/2 - amplitude),
-             (x + line_width/2, wave_y + wave_height/2 + amplitude)],
-            radius=line_width/2,
-            fill=(r, g, b, 240)
-        )
+    # Position from center (0 = center, 1 = edge)
+    distance_from_center = (np.abs(np.arange(num_lines) - (num_lines - 1) / 2)
+                            / ((num_lines - 1) / 2))
+    # Smaller amplitude as we move away from center
+    amplitudes = max_amplitude * (1 - 0.8 * distance_from_center**2)
     
-    # Add a subtle glow effect to the wave
-    glow = wave_overlay.copy()
-    glow = glow.filter(ImageFilter.GaussianBlur(size // 50))
+    # Central position determines color intensity
+    center_factor = 1 - distance_from_center
+    
+    # Gradient from purple to blue
+    colors = np.empty((num_lines, 4), np.uint8)
+    colors[:, 0] = 89 + (41 - 89) * center_factor
+    colors[:, 1] = 65 + (128 - 65) * center_factor
+    colors[:, 2] = 169 + (185 - 169) * center_factor
+    colors[:, 3] = 240
+    
+    # Thicker in center
+    line_widths = np.maximum(
+        2, (size * 0.015 * (0.5 + 0.5 * center_factor)).astype(int))
+    
+    # The wave and its glow only ever touch the rows and columns the bars
+    # cover, padded by the glow's blur reach
+    centers = wave_x + np.arange(num_lines) * line_spacing
+    mid_y = wave_y + wave_height / 2
+    glow_blur = size // 50
+    wave_window = padded_window(
+        int(mid_y - max_amplitude) - 1, int(mid_y + max_amplitude) + 2,
+        int(wave_x - line_widths.max()),
+        int(wave_x + wave_width + line_widths.max()) + 1,
+        glow_blur * 3, size)
+    bar_ys, bar_xs = ys[wave_window[0]], xs[:, wave_window[1]]
     
-    # Composite the glow and wave onto the icon
-    wave_mask = Image.new('L', (size, size), 0)
-    wave_mask_draw = ImageDraw.Draw(wave_mask)
-    wave_mask_draw.rounded_rectangle([(page_x, page_y), (page_x + page_width, page_y + page_height)], 
-                                   page_corner_radius, fill=255)
+    # Rasterize all rounded line segments into one (num_lines, h, w) stack
+    bar_masks = np.stack([
+        rounded_rect_mask(bar_ys, bar_xs,
+                          (x - line_width / 2, mid_y - amplitude,
+                           x + line_width / 2, mid_y + amplitude),
+                          line_width / 2)
+        for x, amplitude, line_width in zip(centers, amplitudes,
+                                            line_widths.tolist())])
     
-    # Apply mask to ensure glow stays within page boundaries
-    glow_masked = Image.new('RGBA', (size, size), (0, 0, 0, 0))
-    glow_masked.paste(glow, (0, 0), wave_mask)
+    # Draw the sound wave lines with gradient color; at small sizes the
+    # 2 pixel minimum width makes neighbouring bars overlap, and as with
+    # ImageDraw the bar drawn last wins
+    covered = bar_masks.any(axis=0)
+    last_bar = num_lines - 1 - bar_masks[::-1].argmax(axis=0)
+    wave_overlay = np.zeros(covered.shape + (4,), np.uint8)
+    wave_overlay[covered] = colors[last_bar[covered]]
+    
+    # Add a subtle glow effect to the wave
+    glow = np.array(gaussian_blur(wave_overlay, glow_blur))
+    
+    # Apply the page mask to ensure glow stays within page boundaries
+    glow *= page_mask[wave_window][..., None]
+    premultiply(glow)
+    premultiply(wave_overlay)
     
     # Composite onto main image
-    icon = Image.alpha_composite(icon, glow_masked)
-    icon = Image.alpha_composite(icon, wave_overlay)
+    alpha_composite_u8(canvas[wave_window], glow)
+    alpha_composite_u8(canvas[wave_window], wave_overlay)
     
     # Add horizontal notebook lines on the page
     line_spacing = page_height / 8
     line_color = (200, 210, 230, 100)  # Very light gray-blue, semi-transparent
     
-    for i in range(1, 8):
-        y_pos = page_y + i * line_spacing
-        draw.line([(page_x + page_width * 0.1, y_pos), (page_x + page_width * 0.9, y_pos)], 
-                 fill=line_color, width=max(1, int(size * 0.002)))
+    line_width = max(1, int(size * 0.002))
+    
+    # Blend all seven lines in one go over the rows they cover, truncating
+    # coordinates and centering the width the same way ImageDraw.line does
+    line_y = (page_y + np.arange(1, 8) * line_spacing).astype(int)
+    line_rows = (line_y[:, None] - (line_width - 1) // 2
+                 + np.arange(line_width)).ravel()
+    line_x0 = int(page_x + page_width * 0.1)
+    line_x1 = int(page_x + page_width * 0.9) + 1
+    stripes = canvas[line_rows, line_x0:line_x1]
+    line_layer = premultiply(np.array([line_color], np.uint8))
+    alpha_composite_u8(stripes, np.broadcast_to(line_layer, stripes.shape))
+    canvas[line_rows, line_x0:line_x1] = stripes
+    
+    unpremultiply(canvas)
+    return canvas
+
+# Create the base icon
+def create_voicejournal_icon(save_path, size=1024):
+    canvas = np.empty((size, size, 4), np.uint8)
+    render_icon(canvas, size)
     
     # Save the icon
-    icon.save(save_path)
+    icon = Image.fromarray(canvas, 'RGBA')
+    save_png(icon, save_path, master=True)
     return icon
 
+# Every output is fully determined by this script, the shared resize
+# pipeline and the Pillow and NumPy builds doing the work, so key the
+# cache by all of them
+def cache_key():
+    digest = hashlib.sha256()
+    for path in (__file__, _resize_common.__file__):
+        with open(path, 'rb') as source:
+            digest.update(source.read())
+    digest.update(f"Pillow {PIL.__version__} NumPy {np.__version__}".encode())
+    return digest.hexdigest()[:16]
+
+# Hash a file's contents, to tell whether an output is still the one we wrote
+def file_digest(path):
+    with open(path, 'rb') as output:
+        return hashlib.sha256(output.read()).hexdigest()
+
 # Create various sizes for iOS
 def create_ios_icon_set(base_path):
-    sizes = [1024, 180, 167, 152, 120, 87, 80, 76, 60, 58, 40, 29, 20]
     icon_paths = {}
+    key = cache_key()
+    cache_dir = os.path.join(base_path, ".cache")
+    os.makedirs(cache_dir, exist_ok=True)
     
-    # Create the base icon at 1024x1024
-    base_icon = create_voicejournal_icon(os.path.join(base_path, "icon_1024.png"), 1024)
-    icon_paths[1024] = os.path.join(base_path, "icon_1024.png")
+    # Create the base icon at 1024x1024, unless these scripts already have
+    master_path = os.path.join(base_path, f"icon_{MASTER_SIZE}.png")
+    cache_path = os.path.join(cache_dir, f"icon_{MASTER_SIZE}_{key}.png")
+    if not os.path.exists(cache_path):
+        create_voicejournal_icon(cache_path, MASTER_SIZE)
+        # Renders cached under older keys can never be served again
+        for stale in glob.glob(os.path.join(cache_dir,
+                                            f"icon_{MASTER_SIZE}_*.png")):
+            if stale != cache_path:
+                os.remove(stale)
+    # Compare contents, since other tools write to the same directory
+    master_current = (os.path.exists(master_path)
+                      and filecmp.cmp(cache_path, master_path, shallow=False))
+    if not master_current:
+        shutil.copyfile(cache_path, master_path)
+    icon_paths[MASTER_SIZE] = master_path
     
-    # Create other sizes by scaling down
-    for size in sizes:
-        if size != 1024:  # Skip the base size which we already created
-            scaled_icon = base_icon.resize((size, size), Image.LANCZOS)
-            file_path = os.path.join(base_path, f"icon_{size}.png")
-            scaled_icon.save(file_path)
-            icon_paths[size] = file_path
+    for size in SCALED_SIZES:
+        icon_paths[size] = os.path.join(base_path, f"icon_{size}.png")
+    
+    # The stamp records the key and the digest of every scaled size written
+    # from the current master; anything else has to be produced again
+    stamp_path = os.path.join(cache_dir, "scaled_sizes.json")
+    recorded = {}
+    if master_current and os.path.exists(stamp_path):
+        with open(stamp_path) as stamp_file:
+            stamp = json.load(stamp_file)
+        if stamp.get("key") == key:
+            recorded = stamp["digests"]
+    stale_sizes = [size for size in SCALED_SIZES
+                   if not os.path.exists(icon_paths[size])
+                   or recorded.get(str(size)) != file_digest(icon_paths[size])]
+    if not stale_sizes:
+        return icon_paths
+    
+    # Create other sizes by scaling down the master
+    base_icon = Image.open(master_path)
+    icon_paths.update(batch_resize(base_icon, stale_sizes, base_path))
+    
+    with open(stamp_path, 'w') as stamp_file:
+        json.dump({"key": key,
+                   "digests": {str(size): file_digest(icon_paths[size])
+                               for size in SCALED_SIZES}}, stamp_file)
     
     return icon_paths
 
 if __name__ == "__main__":
+    # Pillow-SIMD releases carry a ".post" suffix on the Pillow version
+    simd = ".post" in PIL.__version__
+    print(f"Using {'Pillow-SIMD' if simd else 'Pillow'} {PIL.__version__}")
+    
     # Create the icon set
     base_path = os.path.dirname(os.path.abspath(__file__))
     icons = create_ios_icon_set(base_path)
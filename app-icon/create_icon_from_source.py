@@ -2,13 +2,17 @@
 from PIL import Image
 import os
 
-# Define iOS icon sizes needed
-sizes = [1024, 180, 167, 152, 120, 87, 80, 76, 60, 58, 40, 29, 20]
+from _resize_common import MASTER_SIZE, SCALED_SIZES, batch_resize, save_png
 
 def resize_icon(source_image_path, output_dir):
-    # Open the source image
+    # Open and fully decode the source image once, so every size is
+    # resized from the same in-memory pixels; RGB sources stay RGB so the
+    # shipped icons carry no alpha channel
     try:
         source_image = Image.open(source_image_path)
+        if source_image.mode not in ('RGB', 'RGBA'):
+            source_image = source_image.convert('RGBA')
+        source_image.load()
         print(f"Opened source image: {source_image_path}")
     except Exception as e:
         print(f"Error opening source image: {e}")
@@ -17,16 +21,20 @@ def resize_icon(source_image_path, output_dir):
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
     
-    # Generate all required sizes
-    for size in sizes:
-        output_path = os.path.join(output_dir, f"icon_{size}.png")
-        try:
-            # Resize the image with high quality
-            resized_image = source_image.resize((size, size), Image.LANCZOS)
-            resized_image.save(output_path)
-            print(f"Created icon {size}x{size}px: {output_path}")
-        except Exception as e:
-            print(f"Error creating {size}x{size} icon: {e}")
+    # Generate the shipped master, then all the scaled sizes
+    try:
+        master_path = os.path.join(output_dir, f"icon_{MASTER_SIZE}.png")
+        master = source_image.resize((MASTER_SIZE, MASTER_SIZE),
+                                     Image.LANCZOS, reducing_gap=3.0)
+        save_png(master, master_path, master=True)
+        icon_paths = {MASTER_SIZE: master_path}
+        icon_paths.update(batch_resize(source_image, SCALED_SIZES, output_dir))
+    except Exception as e:
+        print(f"Error creating icons: {e}")
+        return
+    
+    for size, output_path in icon_paths.items():
+        print(f"Created icon {size}x{size}px: {output_path}")
 
 if __name__ == "__main__":
     # Source image path